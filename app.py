@@ -1,12 +1,19 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import json
+import plotly.io as pio
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import html
+import orjson
 from pathlib import Path
 import datetime
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 
 try:
     # scraper.py から関数と設定をインポート
@@ -14,17 +21,35 @@ try:
         scrape_prices_for_keyword_and_site,
         save_daily_stats_for_site,
         main_scrape_all,
-        DATA_DIR,
         SITE_CONFIGS,
+        open_price_store,
+        price_partition_filter,
+        save_price_partition,
+        delete_price_partition,
+        get_price_csv_path,
+        DriverPool,
     )
 except ImportError as e:
     st.error(f"scraper.pyのインポートに失敗しました: {e}")
     st.stop()
 
+# st.plotly_chart はFigureを plotly.io.to_json で送るので、エンコーダをorjsonに切り替える
+pio.json.config.default_engine = "orjson"
+
 APP_TITLE = "価格動向トラッカー (マルチサイト対応)"
 BRAND_FILE = Path(__file__).resolve().parent / "brands.json"
 DEFAULT_MOVING_AVERAGE_SHORT = 5
 DEFAULT_MOVING_AVERAGE_LONG = 20
+PRECOMPUTED_MA_WINDOWS = (DEFAULT_MOVING_AVERAGE_SHORT, DEFAULT_MOVING_AVERAGE_LONG)
+RAW_DATA_ROWS = 50
+DEBUG_ASSERT_SORTED = False  # True にするとParquetストアの日付昇順を読み込み時に検証する
+LTTB_THRESHOLD = 2000  # これより長い系列はチャート送信前に間引く
+LTTB_N_OUT = 2000
+MINMAX_PRESELECT_RATIO = 4  # LTTBの前にMinMaxで残す候補点数 (LTTB_N_OUTに対する倍率)
+BAND_MAX_BINS = 800  # 価格帯バンドを集約するバケット数の上限
+PARALLEL_LOAD_MIN_TARGETS = 3  # これ以上のブランドを個別に読む時はスレッドで並列化する
+PARALLEL_LOAD_MAX_WORKERS = 8
+BRAND_MULTISELECT_THRESHOLD = 20  # これより多いブランドを持つカテゴリはマルチセレクトで表示する
 EXPECTED_COLUMNS_BASE = [
     "date",
     "site",
@@ -34,6 +59,16 @@ EXPECTED_COLUMNS_BASE = [
     "min_price",
     "max_price",
 ]
+# 円建ての価格はfloat32で十分 (Parquetストアのスキーマと揃えてキャッシュとチャートのデータ量を半分にする)
+PRICE_CSV_COLUMN_TYPES = {
+    "date": pa.timestamp("ms"),
+    "site": pa.string(),
+    "keyword": pa.string(),
+    "count": pa.int32(),
+    "average_price": pa.float32(),
+    "min_price": pa.float32(),
+    "max_price": pa.float32(),
+}
 
 PLOTLY_COLORS = [
     "#1f77b4",
@@ -47,10 +82,43 @@ PLOTLY_COLORS = [
     "#bcbd22",
     "#17becf",
 ]
+# 塗りつぶし色の事前計算が前提とする "#rrggbb" 形式かを読み込み時に確認する
+assert all(re.fullmatch(r"#[0-9a-fA-F]{6}", c) for c in PLOTLY_COLORS)
+# 価格帯バンドの塗りつぶし色 (PLOTLY_COLORSと同じ並び)
+PLOTLY_FILL_RGBA = tuple(
+    f"rgba({int(c[1:3], 16)},{int(c[3:5], 16)},{int(c[5:7], 16)},0.1)"
+    for c in PLOTLY_COLORS
+)
+
+# st.plotly_chart に渡す描画設定 (使わないモードバーのボタンは読み込まない)
+PLOTLY_CHART_CONFIG = {
+    "displaylogo": False,
+    "modeBarButtonsToRemove": [
+        "lasso2d",
+        "select2d",
+        "autoScale2d",
+        "toggleSpikelines",
+    ],
+    "responsive": True,
+    "scrollZoom": True,
+}
+
+
+def dump_brands_json(brands_data):
+    # json.dump(ensure_ascii=False, indent=2) と同じ出力になる
+    return orjson.dumps(
+        brands_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    )
+
 
+def get_brand_file_mtime_ns():
+    return BRAND_FILE.stat().st_mtime_ns if BRAND_FILE.exists() else 0
 
-@st.cache_data(ttl=3600)
-def load_brands_cached():
+
+# brands.json の更新時刻(ns)をキャッシュキーにし、ファイルが変わらない限り再パースしない
+# (cache_resource なので再実行ごとのコピーも発生しない。戻り値は読み取り専用として扱う)
+@st.cache_resource(ttl=3600)
+def load_brands_cached(brand_file_mtime_ns):
     if not BRAND_FILE.exists():
         st.warning(f"{BRAND_FILE} が見つかりません。サンプルを作成します。")
         default_brands_data = {
@@ -62,21 +130,21 @@ def load_brands_cached():
             "rakuma": {"レディースアパレル": ["SNIDEL", "FRAY I.D"], "未分類": []},
         }
         try:
-            with open(BRAND_FILE, "w", encoding="utf-8") as f:
-                json.dump(default_brands_data, f, ensure_ascii=False, indent=2)
+            with open(BRAND_FILE, "wb") as f:
+                f.write(dump_brands_json(default_brands_data))
             st.info(f"デフォルトの {BRAND_FILE} を作成しました。")
             return default_brands_data
         except Exception as e:
             st.error(f"デフォルトの {BRAND_FILE} の作成に失敗しました: {e}")
             return {"mercari": {"未分類": []}}
     try:
-        with open(BRAND_FILE, "r", encoding="utf-8") as f:
+        with open(BRAND_FILE, "rb") as f:
             content = f.read()
             if not content:
                 st.warning(f"{BRAND_FILE} は空です。サンプルデータで初期化します。")
                 return {}
-            return json.loads(content)
-    except json.JSONDecodeError as e:
+            return orjson.loads(content)
+    except orjson.JSONDecodeError as e:
         st.error(f"{BRAND_FILE} のJSON形式が正しくありません: {e}")
         return {"mercari": {"未分類": []}}
     except Exception as e:
@@ -84,40 +152,353 @@ def load_brands_cached():
         return {"mercari": {"未分類": []}}
 
 
+def copy_brands_for_update(brands_data, site_name, category):
+    # 変更するサイト・カテゴリの部分だけをコピーし、他はキャッシュ済みのオブジェクトを共有する
+    # (サイト・カテゴリがなければ空で作る)
+    updated = dict(brands_data)
+    updated[site_name] = dict(updated.get(site_name, {}))
+    updated[site_name][category] = list(updated[site_name].get(category, []))
+    return updated
+
+
 def save_brands_to_json(brands_data):
     try:
-        with open(BRAND_FILE, "w", encoding="utf-8") as f:
-            json.dump(brands_data, f, ensure_ascii=False, indent=2)
-        load_brands_cached.clear()
+        # 一時ファイルに書いてから置き換え、書き込み途中のファイルを読まれないようにする
+        tmp_file = BRAND_FILE.with_suffix(".json.tmp")
+        tmp_file.write_bytes(dump_brands_json(brands_data))
+        tmp_file.replace(BRAND_FILE)
+        # 書き込みで更新時刻が変わるため、次回の読み込みは自動的に再パースされる
         return True
     except Exception as e:
         st.error(f"brands.jsonへの書き込み中にエラーが発生しました: {e}")
         return False
 
 
-@st.cache_data(ttl=600)
-def load_price_data_cached(site_name, brand_keyword):
-    safe_brand_keyword = re.sub(r'[\\/*?:"<>|]', "_", brand_keyword)
-    safe_site_name = re.sub(r'[\\/*?:"<>|]', "_", site_name)
-    file_name = f"{safe_site_name}_{safe_brand_keyword}.csv"
-    file_path = DATA_DIR / file_name
+def is_partition_fresh(csv_path, partition_mtime_ns):
+    # git pull 等でCSVの方が新しくなっていればParquetストアは使わない
+    return not csv_path.exists() or csv_path.stat().st_mtime_ns <= partition_mtime_ns
 
-    if file_path.exists():
-        try:
-            df = pd.read_csv(file_path)
-            missing_cols = [
-                col for col in EXPECTED_COLUMNS_BASE if col not in df.columns
-            ]
-            if missing_cols:
-                return pd.DataFrame()
+
+def read_price_store(site_name, brand_keyword, csv_path):
+    # Parquetストアから (site, keyword) のパーティションだけを読む。
+    # パーティションがない、またはCSVの方が新しい場合は None を返す
+    dataset = open_price_store()
+    if dataset is None:
+        return None
+    partition_filter = price_partition_filter(site_name, brand_keyword)
+    fragment_paths = [
+        Path(fragment.path) for fragment in dataset.get_fragments(filter=partition_filter)
+    ]
+    if not fragment_paths:
+        return None
+    if not is_partition_fresh(
+        csv_path, max(path.stat().st_mtime_ns for path in fragment_paths)
+    ):
+        return None
+    # 書き込み時に日付昇順・型変換済みなので、ここでは変換しない
+    # (日次の追記ファイルもファイル名順 = 日付順に読まれる)
+    table = dataset.to_table(filter=partition_filter, columns=EXPECTED_COLUMNS_BASE)
+    # site/keyword は全行同じ値なのでカテゴリ型 (辞書エンコード) で持つ
+    df = table.to_pandas(strings_to_categorical=True)
+    if DEBUG_ASSERT_SORTED:
+        assert df["date"].is_monotonic_increasing, f"{site_name}: {brand_keyword}"
+    if not df["date"].is_monotonic_increasing:
+        df = df.sort_values(by="date", kind="mergesort", ignore_index=True)
+    return df
+
+
+def read_price_csv(csv_path):
+    # 存在確認とサイズ確認を1回のstatで済ませ、中身のないファイルはパーサを起動しない
+    try:
+        if csv_path.stat().st_size == 0:
+            return pd.DataFrame()
+    except FileNotFoundError:
+        return pd.DataFrame()
+    # pyarrowのマルチスレッドCSVパーサで、日付・数値の型変換まで読み込み時に済ませる
+    # (日次データなのでミリ秒精度。チャートではint64のエポックmsとして渡す)。
+    # 必要な列だけを読み、どれかが欠けているファイルは空として扱う
+    try:
+        table = pacsv.read_csv(
+            csv_path,
+            convert_options=pacsv.ConvertOptions(
+                column_types=PRICE_CSV_COLUMN_TYPES,
+                include_columns=EXPECTED_COLUMNS_BASE,
+            ),
+        )
+    except (pa.ArrowKeyError, pa.ArrowInvalid):
+        return pd.DataFrame()
+    if table.num_rows == 0:
+        return pd.DataFrame()
+    df = table.to_pandas(strings_to_categorical=True)
+    # 保存時に日付昇順で書いているので、手作業のバックフィル等で崩れた時だけ並べ替える
+    if not df["date"].is_monotonic_increasing:
+        df = df.sort_values(by="date", kind="mergesort", ignore_index=True)
+    return df
+
+
+def rolling_means(values, windows):
+    # rolling(window, min_periods=1).mean() と同じ結果を累積和の差分で O(N) に計算する
+    # (欠損値は合計にも件数にも含めない)。累積和は1回だけ作り、複数ウィンドウで共有する
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    upper = np.arange(1, values.size + 1)
+    upper_sums = sums[upper]
+    upper_counts = counts[upper]
+    results = []
+    for window in windows:
+        lower = np.maximum(upper - window, 0)
+        window_counts = upper_counts - counts[lower]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = (upper_sums - sums[lower]) / window_counts
+        means[window_counts == 0] = np.nan
+        results.append(means)
+    return results
+
+
+def rolling_mean(values, window):
+    return rolling_means(values, (window,))[0]
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: 先頭と末尾を固定し、残りをn_out-2個のバケットに分けて
+    # 「前に選んだ点」と「次のバケットの平均点」で作る三角形の面積が最大の点を各バケットから選ぶ
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # 「次のバケットの平均点」はループに入る前にまとめて計算しておく
+    next_starts = edges[1:]
+    next_counts = np.diff(np.append(next_starts, n))
+    next_xs = np.add.reduceat(x, next_starts) / next_counts
+    next_ys = np.add.reduceat(y, next_starts) / next_counts
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = next_xs[i]
+        next_y = next_ys[i]
+        areas = np.abs(
+            (x[selected] - next_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (next_y - y[selected])
+        )
+        selected = start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+        indices[i + 1] = selected
+    return indices
+
+
+def minmax_indices(y, n_buckets):
+    # 各バケットの最小値・最大値の位置だけを残す (先頭と末尾は必ず含める)
+    n = len(y)
+    y = np.asarray(y, dtype=np.float64)
+    interior = y[1 : n - 1]
+    bucket_size = -(-interior.size // n_buckets)
+    n_rows = -(-interior.size // bucket_size)
+    offsets = 1 + np.arange(n_rows) * bucket_size
+    nan_mask = np.isnan(interior)
+    lows = np.full(n_rows * bucket_size, np.inf)
+    lows[: interior.size] = np.where(nan_mask, np.inf, interior)
+    highs = np.full(n_rows * bucket_size, -np.inf)
+    highs[: interior.size] = np.where(nan_mask, -np.inf, interior)
+    return np.unique(
+        np.concatenate(
+            (
+                [0, n - 1],
+                offsets + lows.reshape(n_rows, bucket_size).argmin(axis=1),
+                offsets + highs.reshape(n_rows, bucket_size).argmax(axis=1),
+            )
+        )
+    )
+
+
+def minmax_lttb_indices(x, y, n_out):
+    # MinMaxLTTB: 非常に長い系列はバケットごとの最小・最大で候補を n_out * 比率 程度に絞ってからLTTBをかける
+    n = len(x)
+    if n <= n_out * MINMAX_PRESELECT_RATIO:
+        return lttb_indices(x, y, n_out)
+    candidates = minmax_indices(y, n_out * MINMAX_PRESELECT_RATIO // 2)
+    return candidates[
+        lttb_indices(np.asarray(x)[candidates], np.asarray(y)[candidates], n_out)
+    ]
+
+
+def aggregate_price_band(x, lows, highs, n_bins):
+    # 価格帯を n_bins 個のバケットの最安値・最高値に集約する (欠損値は無視)。
+    # x はバケット先頭の値で、末尾の点は形を保つためそのまま残す
+    n = len(x)
+    if n <= n_bins:
+        return x, lows, highs
+    starts = np.linspace(0, n, n_bins + 1).astype(np.int64)[:-1]
+    return (
+        np.concatenate((x[starts], x[-1:])),
+        np.concatenate((np.fmin.reduceat(lows, starts), lows[-1:])),
+        np.concatenate((np.fmax.reduceat(highs, starts), highs[-1:])),
+    )
+
+
+def add_precomputed_columns(df):
+    # UIデフォルトの移動平均はキャッシュ対象として読み込み時に計算しておく
+    for window, means in zip(
+        PRECOMPUTED_MA_WINDOWS,
+        rolling_means(df["average_price"].to_numpy(), PRECOMPUTED_MA_WINDOWS),
+    ):
+        df[f"ma_{window}"] = means.astype("float32")
+    return df
+
+
+def load_price_data(site_name, brand_keyword, migrate=True):
+    # キャッシュなしの読み込み本体 (st.* を呼ばないのでワーカースレッドからも使える)。
+    # migrate=False ではCSVから読んでもParquetストアへは書かない (呼び出し側でまとめて移行する)
+    file_path = get_price_csv_path(site_name, brand_keyword)
+
+    try:
+        df = read_price_store(site_name, brand_keyword, file_path)
+        if df is None:
+            df = read_price_csv(file_path)
             if df.empty:
                 return pd.DataFrame()
-            df["date"] = pd.to_datetime(df["date"])
-            df = df.sort_values(by="date")
-            return df
-        except Exception:
+            # CSVしかない (または古い) ブランドはここでParquetストアへ移行する
+            if migrate:
+                save_price_partition(site_name, brand_keyword, df)
+        if df.empty:
             return pd.DataFrame()
-    return pd.DataFrame()
+        return add_precomputed_columns(df)
+    except Exception:
+        return pd.DataFrame()
+
+
+def get_price_csv_signature(site_name, brand_keyword):
+    # 価格CSVの (更新時刻ns, サイズ)。キャッシュキーに含め、更新されたブランドだけを読み直す
+    try:
+        csv_stat = get_price_csv_path(site_name, brand_keyword).stat()
+    except FileNotFoundError:
+        return None
+    return (csv_stat.st_mtime_ns, csv_stat.st_size)
+
+
+# csv_signature はキャッシュキーとしてだけ使う (スクレイパーがCSVを更新すると別エントリになる)
+@st.cache_data(ttl=600)
+def load_price_data_cached(site_name, brand_keyword, csv_signature):
+    return load_price_data(site_name, brand_keyword)
+
+
+@st.cache_data(ttl=600)
+def load_price_data_bulk_cached(csv_signatures):
+    # csv_signatures: (((site, keyword), CSVのシグネチャ), ...)
+    # 選択ブランドをParquetストアの1回のスキャンでまとめて読み、メモリ上でブランドごとに分割する
+    targets = [target for target, _ in csv_signatures]
+    frames = {}
+    dataset = open_price_store()
+    if dataset is not None and targets:
+        bulk_filter = ds.field("site").isin(
+            sorted({site_name for site_name, _ in targets})
+        ) & ds.field("keyword").isin(sorted({keyword for _, keyword in targets}))
+        partition_mtimes = {}
+        for fragment in dataset.get_fragments(filter=bulk_filter):
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            target = (keys["site"], keys["keyword"])
+            partition_mtimes[target] = max(
+                partition_mtimes.get(target, 0), Path(fragment.path).stat().st_mtime_ns
+            )
+        fresh_targets = {
+            target
+            for target in targets
+            if target in partition_mtimes
+            and is_partition_fresh(
+                get_price_csv_path(*target), partition_mtimes[target]
+            )
+        }
+        if fresh_targets:
+            bulk_df = dataset.to_table(
+                filter=bulk_filter, columns=EXPECTED_COLUMNS_BASE
+            ).to_pandas(strings_to_categorical=True)
+            for target, df in bulk_df.groupby(
+                ["site", "keyword"], sort=False, observed=True
+            ):
+                if target not in fresh_targets:
+                    continue
+                df = df.reset_index(drop=True)
+                if not df["date"].is_monotonic_increasing:
+                    df = df.sort_values(by="date", kind="mergesort", ignore_index=True)
+                frames[target] = add_precomputed_columns(df)
+    # ストアにない・CSVより古いブランドは個別に読む (CSV読込とストア移行)。
+    # 件数が多い時はCSVの読み込みだけをスレッドで重ね、ストアへの書き込みは1つずつ行う
+    missing_targets = [target for target in targets if target not in frames]
+    if len(missing_targets) >= PARALLEL_LOAD_MIN_TARGETS:
+        with ThreadPoolExecutor(max_workers=PARALLEL_LOAD_MAX_WORKERS) as executor:
+            frames.update(
+                zip(
+                    missing_targets,
+                    executor.map(
+                        lambda target: load_price_data(*target, migrate=False),
+                        missing_targets,
+                    ),
+                )
+            )
+        for target in missing_targets:
+            if not frames[target].empty:
+                save_price_partition(*target, frames[target])
+    else:
+        for target, csv_signature in csv_signatures:
+            if target not in frames:
+                frames[target] = load_price_data_cached(*target, csv_signature)
+    return frames
+
+
+@st.cache_data(ttl=600)
+def compute_ma(site_name, brand_keyword, window, csv_signature, _df):
+    # デフォルト以外のウィンドウが指定された場合の移動平均 (列のみ返す)。
+    # 表示中のdfから計算し、キャッシュキーはCSVのシグネチャで代用する (dfはハッシュしない)
+    return rolling_mean(_df["average_price"], window).astype(np.float32)
+
+
+@st.cache_data(ttl=600)
+def load_recent_rows_table_cached(site_name, brand_keyword, csv_signature):
+    # 生データ表示用: 最新N件を新しい順に並べたArrowテーブル (st.dataframeがそのまま扱える)
+    df = load_price_data_cached(site_name, brand_keyword, csv_signature)
+    if df.empty:
+        return pa.table({})
+    recent_df = df[EXPECTED_COLUMNS_BASE].tail(RAW_DATA_ROWS).iloc[::-1]
+    return pa.Table.from_pandas(recent_df, preserve_index=False)
+
+
+def get_moving_average(df, site_name, brand_keyword, window, csv_signature):
+    column_name = f"ma_{window}"
+    if column_name in df.columns:
+        return df[column_name].to_numpy()
+    return compute_ma(site_name, brand_keyword, window, csv_signature, df)
+
+
+def get_price_data_bulk(csv_signatures):
+    # csv_signatures: {(site, keyword): CSVのシグネチャ}
+    # 無関係なウィジェット操作での再実行時はキャッシュ層を経由せずセッション内の辞書から返し、
+    # CSVのシグネチャが変わったブランドだけをキャッシュ層から取り直す
+    session_cache = st.session_state.setdefault("_brand_df_cache", {})
+    # 選択から外れたブランドはセッションに持ち続けない
+    for target in [target for target in session_cache if target not in csv_signatures]:
+        del session_cache[target]
+    frames = {
+        target: session_cache[target][1]
+        for target, csv_signature in csv_signatures.items()
+        if target in session_cache and session_cache[target][0] == csv_signature
+    }
+    changed_signatures = tuple(
+        (target, csv_signature)
+        for target, csv_signature in csv_signatures.items()
+        if target not in frames
+    )
+    if changed_signatures:
+        for target, df in load_price_data_bulk_cached(changed_signatures).items():
+            frames[target] = df
+            # 読み込みに失敗した空のフレームはセッションに残さず、次の再実行でキャッシュ層に任せる
+            if not df.empty:
+                session_cache[target] = (csv_signatures[target], df)
+    return {target: frames[target] for target in csv_signatures}
 
 
 def create_multi_brand_price_trend_chart(
@@ -130,8 +511,12 @@ def create_multi_brand_price_trend_chart(
     if not dataframes_dict:
         return go.Figure().update_layout(title="表示するデータが選択されていません")
 
-    fig = make_subplots(specs=[[{"secondary_y": False}]])
+    # トレースは素のdictで溜めて最後に1回でFigureへ渡す (検証が1回で済む)
+    traces = []
     color_idx = 0
+    # 0日 (非表示) の移動平均はブランドごとのループに入る前に除外する
+    do_short = ma_short > 0
+    do_long = ma_long > 0
 
     for (
         target_display_key,
@@ -141,6 +526,7 @@ def create_multi_brand_price_trend_chart(
         df = df_data["df"]
         site_name = df_data["site"]
         brand_name = df_data["brand_keyword"]  # ここはブランド名のみ
+        csv_signature = df_data["csv_signature"]
 
         if df.empty or "average_price" not in df.columns:
             continue
@@ -148,75 +534,89 @@ def create_multi_brand_price_trend_chart(
         current_color = PLOTLY_COLORS[color_idx % len(PLOTLY_COLORS)]
         # 凡例の表示名: サイト名は含めるが、カテゴリ名は含めない
         legend_name_prefix = f"{site_name}: {brand_name}"
+        # datetime64[ms] -> int64 はコピーなしのビュー。Plotly側で日付の文字列化を省ける
+        dates_ms = df["date"].to_numpy(dtype="datetime64[ms]").view("int64")
+        # 移動平均はトレース作成前にブランドごと1回だけ配列として取り出す (dfは変更しない)
+        ma_short_values = (
+            get_moving_average(df, site_name, brand_name, ma_short, csv_signature)
+            if do_short and len(df) >= ma_short
+            else None
+        )
+        ma_long_values = (
+            get_moving_average(df, site_name, brand_name, ma_long, csv_signature)
+            if do_long and len(df) >= ma_long
+            else None
+        )
+        average_prices = df["average_price"].to_numpy()
+        show_band = (
+            show_price_range_for_primary
+            and target_display_key == primary_target_for_band_display
+            and all(c in df.columns for c in ["min_price", "max_price"])
+        )
+        if show_band:
+            # バンドは全件の最安値・最高値をバケットごとに集約したシルエットとして描く
+            band_dates_ms, band_min_prices, band_max_prices = aggregate_price_band(
+                dates_ms,
+                df["min_price"].to_numpy(),
+                df["max_price"].to_numpy(),
+                BAND_MAX_BINS,
+            )
+
+        # 長い履歴はLTTBで間引いてから送る (移動平均は全件で計算済みの値を同じ点で抜き出す)
+        if len(df) > LTTB_THRESHOLD:
+            keep = minmax_lttb_indices(dates_ms, average_prices, LTTB_N_OUT)
+            dates_ms = dates_ms[keep]
+            average_prices = average_prices[keep]
+            if ma_short_values is not None:
+                ma_short_values = ma_short_values[keep]
+            if ma_long_values is not None:
+                ma_long_values = ma_long_values[keep]
 
-        fig.add_trace(
-            go.Scatter(
-                x=df["date"],
-                y=df["average_price"],
+        traces.append(
+            dict(
+                type="scattergl",
+                x=dates_ms,
+                y=average_prices,
                 name=f"{legend_name_prefix} 平均",
                 mode="lines+markers",
                 line=dict(color=current_color, width=2),
             )
         )
 
-        if (
-            show_price_range_for_primary
-            and target_display_key == primary_target_for_band_display
-            and all(c in df.columns for c in ["min_price", "max_price"])
-        ):
-            try:
-                r, g, b = (
-                    int(current_color[1:3], 16),
-                    int(current_color[3:5], 16),
-                    int(current_color[5:7], 16),
-                )
-                fill_rgba = f"rgba({r},{g},{b},0.1)"
-                fig.add_trace(
-                    go.Scatter(
-                        x=df["date"],
-                        y=df["max_price"],
-                        mode="lines",
-                        line=dict(width=0),
-                        showlegend=False,
-                        fillcolor=fill_rgba,
-                    )
-                )
-                fig.add_trace(
-                    go.Scatter(
-                        x=df["date"],
-                        y=df["min_price"],
-                        mode="lines",
-                        line=dict(width=0),
-                        showlegend=False,
-                        fill="tonexty",
-                        fillcolor=fill_rgba,
-                    )
+        if show_band:
+            # 最高値→最安値(逆順)を1つの閉じた多角形として描画する
+            traces.append(
+                dict(
+                    type="scattergl",
+                    x=np.concatenate([band_dates_ms, band_dates_ms[::-1]]),
+                    y=np.concatenate([band_max_prices, band_min_prices[::-1]]),
+                    mode="lines",
+                    line=dict(width=0),
+                    showlegend=False,
+                    fill="toself",
+                    fillcolor=PLOTLY_FILL_RGBA[color_idx % len(PLOTLY_FILL_RGBA)],
+                    hoverinfo="skip",
                 )
-            except ValueError:
-                pass
-
-        if ma_short > 0 and len(df) >= ma_short:
-            df[f"ma_short"] = (
-                df["average_price"].rolling(window=ma_short, min_periods=1).mean()
             )
-            fig.add_trace(
-                go.Scatter(
-                    x=df["date"],
-                    y=df[f"ma_short"],
+
+        if ma_short_values is not None:
+            traces.append(
+                dict(
+                    type="scattergl",
+                    x=dates_ms,
+                    y=ma_short_values,
                     name=f"{legend_name_prefix} {ma_short}日MA",
                     mode="lines",
                     line=dict(color=current_color, dash="dash"),
                     opacity=0.7,
                 )
             )
-        if ma_long > 0 and len(df) >= ma_long:
-            df[f"ma_long"] = (
-                df["average_price"].rolling(window=ma_long, min_periods=1).mean()
-            )
-            fig.add_trace(
-                go.Scatter(
-                    x=df["date"],
-                    y=df[f"ma_long"],
+        if ma_long_values is not None:
+            traces.append(
+                dict(
+                    type="scattergl",
+                    x=dates_ms,
+                    y=ma_long_values,
                     name=f"{legend_name_prefix} {ma_long}日MA",
                     mode="lines",
                     line=dict(color=current_color, dash="dot"),
@@ -225,41 +625,379 @@ def create_multi_brand_price_trend_chart(
             )
         color_idx += 1
 
-    fig.update_layout(
-        title="価格動向チャート (複数サイト/ブランド対応)",
-        xaxis_title="日付",
-        yaxis_title="価格 (円)",
-        legend_title_text="サイト: ブランド / 指標",
-        hovermode="x unified",
-        font_family="sans-serif",
+    # レンジスライダーは全トレースを縮小表示でもう一度描くので、1ブランドの時だけ出す。
+    # 複数ブランドでは軽い期間切り替えボタンで代用する
+    if len(dataframes_dict) == 1:
+        xaxis = dict(title="日付", type="date", rangeslider=dict(visible=True))
+    else:
+        xaxis = dict(
+            title="日付",
+            type="date",
+            rangeselector=dict(
+                buttons=[
+                    dict(count=7, label="1週間", step="day", stepmode="backward"),
+                    dict(count=1, label="1ヶ月", step="month", stepmode="backward"),
+                    dict(label="全期間", step="all"),
+                ]
+            ),
+        )
+    return go.Figure(
+        data=traces,
+        layout=dict(
+            title="価格動向チャート (複数サイト/ブランド対応)",
+            xaxis=xaxis,
+            yaxis=dict(title="価格 (円)"),
+            legend=dict(title_text="サイト: ブランド / 指標"),
+            hovermode="x",
+            font=dict(family="sans-serif"),
+            uirevision="chart",  # 再描画時もズーム・パン状態を保持
+        ),
     )
-    fig.update_xaxes(rangeslider_visible=True)
-    return fig
+
+
+def iter_scrape_results(targets):
+    # サイトごとに上限付きのスレッドプールで並列にスクレイピングし、
+    # 完了した順に (target, prices, error) を返す。UIの更新は呼び出し側 (メインスレッド) で行う
+    targets_by_site = {}
+    for target in targets:
+        targets_by_site.setdefault(target["site"], []).append(target)
+
+    with ExitStack() as stack:
+        # WebDriverはこの一括取得の間だけプールで使い回す。
+        # プールを先に入れておき、全ワーカーの終了後に閉じる
+        driver_pool = stack.enter_context(DriverPool())
+        future_to_target = {}
+        for site_name, site_targets in targets_by_site.items():
+            # サイト設定はサイトごとに1回だけ引く
+            site_config = SITE_CONFIGS.get(site_name, {})
+            max_items_to_scrape = site_config.get("max_items_to_scrape", 30)
+            executor = stack.enter_context(
+                ThreadPoolExecutor(max_workers=site_config.get("max_workers", 1))
+            )
+            for target in site_targets:
+                future = executor.submit(
+                    scrape_prices_for_keyword_and_site,
+                    target["site"],
+                    target["brand_keyword"],
+                    max_items_override=max_items_to_scrape,
+                    driver_pool=driver_pool,
+                )
+                future_to_target[future] = target
+        for future in as_completed(future_to_target):
+            error = future.exception()
+            yield future_to_target[future], (
+                None if error is not None else future.result()
+            ), error
+
+
+def get_chart_targets_key(dataframes_dict):
+    # 表示対象と各データの最終日・件数・最新値だけの軽いフィンガープリント。
+    # 当日分の再取得は同じ行を上書きするため、最新値とCSVのシグネチャも含める
+    return tuple(
+        (
+            display_name,
+            df_data["csv_signature"],
+            df_data["df"]["date"].iat[-1].value,
+            len(df_data["df"]),
+            float(df_data["df"]["average_price"].iat[-1]),
+        )
+        for display_name, df_data in dataframes_dict.items()
+    )
+
+
+# 入力が同じならFigureを作り直さず使い回す (_dataframes_dict はハッシュ対象外)
+# 選択の組み合わせを行き来しても再利用できるよう多めに持ち、データ読込キャッシュと同じ10分で捨てる
+@st.cache_resource(max_entries=32, ttl=600)
+def build_price_trend_chart_cached(
+    targets_key,
+    _dataframes_dict,
+    ma_short,
+    ma_long,
+    show_price_range_for_primary,
+    primary_target_for_band_display,
+):
+    return create_multi_brand_price_trend_chart(
+        _dataframes_dict,
+        ma_short,
+        ma_long,
+        show_price_range_for_primary=show_price_range_for_primary,
+        primary_target_for_band_display=primary_target_for_band_display,
+    )
+
+
+def refresh_last_active_target():
+    # 最後に操作したブランドが選択から外れていたら、残っている選択の最後のものに切り替える
+    selected = st.session_state.selected_targets_for_chart
+    last_active = st.session_state.last_active_target_for_update
+    if last_active is None or last_active["display_name"] in selected:
+        return
+    st.session_state.last_active_target_for_update = next(
+        reversed(selected.values()), None
+    )
+
+
+def make_brand_target(site_name, brand_keyword, category):
+    return {
+        "site": site_name,
+        "brand_keyword": brand_keyword,
+        "display_name": f"{site_name}: {brand_keyword}",
+        "category_for_json": category,
+    }
+
+
+def get_brand_checkbox_key(display_name):
+    return f"cb_target_{display_name.replace(' ', '_').replace('::','__').replace(':','_')}"
+
+
+def get_brand_multiselect_key(site_name, category):
+    return f"ms_{site_name}_{category}"
+
+
+def apply_brand_selection_form(site_name, current_brands_on_site):
+    # フォーム送信時に、チェックボックス・マルチセレクトの状態からこのサイトの選択をまとめて反映する
+    checked_targets = {}
+    for category, brands_in_cat in current_brands_on_site.items():
+        if len(brands_in_cat) > BRAND_MULTISELECT_THRESHOLD:
+            chosen = st.session_state.get(
+                get_brand_multiselect_key(site_name, category), []
+            )
+        else:
+            chosen = [
+                brand_name
+                for brand_name in brands_in_cat
+                if st.session_state.get(
+                    get_brand_checkbox_key(f"{site_name}: {brand_name}")
+                )
+            ]
+        for brand_name in chosen:
+            target_obj = make_brand_target(site_name, brand_name, category)
+            checked_targets[target_obj["display_name"]] = target_obj
+
+    selected = st.session_state.selected_targets_for_chart
+    for display_name in [name for name in selected if name not in checked_targets]:
+        del selected[display_name]
+    for display_name, target_obj in checked_targets.items():
+        if display_name not in selected:
+            selected[display_name] = target_obj
+            st.session_state.last_active_target_for_update = target_obj
+    refresh_last_active_target()
+
+
+def on_site_display_change():
+    # サイトを切り替えたら、前のサイトのブランド選択は解除する
+    st.session_state.selected_targets_for_chart = {}
+
+
+# チェックボックスの操作はフォーム内に溜め、「適用」を押した時だけ選択を反映して再実行する
+def render_brand_picker(selected_site_for_display, current_brands_on_site):
+    selected = st.session_state.selected_targets_for_chart
+
+    with st.form("brand_selection_form", border=False):
+        for category, brands_in_cat in current_brands_on_site.items():
+            with st.expander(f"{category} ({len(brands_in_cat)})", expanded=False):
+                # ブランド数の多いカテゴリはチェックボックスを並べず、1つのマルチセレクトにまとめる
+                if len(brands_in_cat) > BRAND_MULTISELECT_THRESHOLD:
+                    st.multiselect(
+                        category,
+                        brands_in_cat,
+                        default=[
+                            brand_name
+                            for brand_name in brands_in_cat
+                            if f"{selected_site_for_display}: {brand_name}" in selected
+                        ],
+                        key=get_brand_multiselect_key(
+                            selected_site_for_display, category
+                        ),
+                        label_visibility="collapsed",
+                    )
+                    continue
+                for brand_name_from_json in brands_in_cat:
+                    display_name = f"{selected_site_for_display}: {brand_name_from_json}"
+                    # The 'value' param is only used if the key is not in st.session_state.
+                    # Otherwise, the widget's own state in st.session_state is used.
+                    st.checkbox(
+                        f"{brand_name_from_json}",
+                        value=display_name in selected,
+                        key=get_brand_checkbox_key(display_name),
+                    )
+        st.form_submit_button(
+            "選択を適用",
+            on_click=apply_brand_selection_form,
+            args=(selected_site_for_display, current_brands_on_site),
+            use_container_width=True,
+        )
+
+
+# ブランド管理のウィジェット操作はこのフラグメント内だけで再実行される
+@st.fragment
+def render_brand_management(brands_data_all_sites):
+    with st.expander("ブランド管理 (追加)"):
+        st.subheader("新しいブランドの追加")
+        add_sites_list = list(brands_data_all_sites.keys())
+        if not add_sites_list:
+            add_sites_list = ["mercari"]
+        add_selected_site_for_new_brand = st.selectbox(
+            "追加先のサイト", add_sites_list, key="add_brand_site_sel_brand"
+        )
+
+        site_categories_for_new_brand = list(
+            brands_data_all_sites.get(add_selected_site_for_new_brand, {"未分類": []})
+        )
+        if not site_categories_for_new_brand:
+            site_categories_for_new_brand = ["未分類"]
+
+        add_selected_category_for_new_brand = st.selectbox(
+            "追加先のカテゴリ (整理用)",
+            site_categories_for_new_brand,
+            key="add_brand_cat_sel_multi_site_brand",
+        )
+        new_brand_name_input_for_add = st.text_input(
+            "追加するブランド名", key="add_brand_name_in_multi_site_brand"
+        )
+
+        if st.button("このブランドを追加", key="add_brand_btn_multi_site_brand"):
+            if (
+                add_selected_site_for_new_brand
+                and add_selected_category_for_new_brand
+                and new_brand_name_input_for_add
+            ):
+                new_brand_name_to_add = new_brand_name_input_for_add.strip()
+                if not new_brand_name_to_add:
+                    st.warning("ブランド名を入力してください。")
+                else:
+                    # 変更操作の時だけファイルの最新内容を取り直す
+                    # (キャッシュは全セッション共有なので、変更する部分だけコピーする)
+                    all_brands_data_for_add = copy_brands_for_update(
+                        load_brands_cached(get_brand_file_mtime_ns()),
+                        add_selected_site_for_new_brand,
+                        add_selected_category_for_new_brand,
+                    )
+
+                    if (
+                        new_brand_name_to_add
+                        in all_brands_data_for_add[add_selected_site_for_new_brand][
+                            add_selected_category_for_new_brand
+                        ]
+                    ):
+                        st.warning(
+                            f"ブランド「{new_brand_name_to_add}」はサイト「{add_selected_site_for_new_brand}」のカテゴリ「{add_selected_category_for_new_brand}」に既に存在します。"
+                        )
+                    else:
+                        all_brands_data_for_add[add_selected_site_for_new_brand][
+                            add_selected_category_for_new_brand
+                        ].append(new_brand_name_to_add)
+                        all_brands_data_for_add[add_selected_site_for_new_brand][
+                            add_selected_category_for_new_brand
+                        ].sort()
+                        if save_brands_to_json(all_brands_data_for_add):
+                            st.success(
+                                f"ブランド「{new_brand_name_to_add}」をサイト「{add_selected_site_for_new_brand}」のカテゴリ「{add_selected_category_for_new_brand}」に追加しました。"
+                            )
+                            st.rerun()
+            else:
+                st.warning(
+                    "追加先のサイト、カテゴリ、ブランド名をすべて入力してください。"
+                )
+
+        st.markdown("---")
+        st.subheader("ブランドの削除")
+        del_sites_list = list(brands_data_all_sites.keys())
+        if not del_sites_list:
+            del_sites_list = ["mercari"]
+        del_selected_site_for_brand = st.selectbox(
+            "削除するブランドのサイト", del_sites_list, key="del_brand_site_sel_brand"
+        )
+
+        del_site_categories = list(
+            brands_data_all_sites.get(del_selected_site_for_brand, {"未分類": []})
+        )
+        if not del_site_categories:
+            del_site_categories = ["未分類"]
+
+        del_selected_category_for_brand = st.selectbox(
+            "削除するブランドのカテゴリ",
+            del_site_categories,
+            key="del_brand_cat_sel_multi_site_brand",
+        )
+
+        brands_in_category = brands_data_all_sites.get(del_selected_site_for_brand, {}).get(del_selected_category_for_brand, [])
+        if not brands_in_category:
+            st.info(f"「{del_selected_site_for_brand}」の「{del_selected_category_for_brand}」カテゴリにはブランドが登録されていません。")
+        else:
+            del_selected_brand = st.selectbox(
+                "削除するブランド",
+                brands_in_category,
+                key="del_brand_name_sel_multi_site_brand",
+            )
+
+            if st.button("このブランドを削除", key="del_brand_btn_multi_site_brand", type="primary"):
+                if del_selected_brand:
+                    # 変更操作の時だけファイルの最新内容を取り直す
+                    # (キャッシュは全セッション共有なので、変更する部分だけコピーする)
+                    all_brands_data_for_del = load_brands_cached(get_brand_file_mtime_ns())
+                    if (
+                        del_selected_site_for_brand in all_brands_data_for_del
+                        and del_selected_category_for_brand in all_brands_data_for_del[del_selected_site_for_brand]
+                        and del_selected_brand in all_brands_data_for_del[del_selected_site_for_brand][del_selected_category_for_brand]
+                    ):
+                        all_brands_data_for_del = copy_brands_for_update(
+                            all_brands_data_for_del,
+                            del_selected_site_for_brand,
+                            del_selected_category_for_brand,
+                        )
+                        all_brands_data_for_del[del_selected_site_for_brand][del_selected_category_for_brand].remove(del_selected_brand)
+                        if save_brands_to_json(all_brands_data_for_del):
+                            st.success(
+                                f"ブランド「{del_selected_brand}」をサイト「{del_selected_site_for_brand}」のカテゴリ「{del_selected_category_for_brand}」から削除しました。"
+                            )
+                            # 関連するCSVファイルも削除
+                            csv_file = get_price_csv_path(
+                                del_selected_site_for_brand, del_selected_brand
+                            )
+                            if csv_file.exists():
+                                try:
+                                    csv_file.unlink()
+                                    st.info(f"関連するデータファイル（{csv_file.name}）も削除しました。")
+                                except Exception as e:
+                                    st.warning(f"データファイルの削除に失敗しました: {e}")
+                            try:
+                                delete_price_partition(
+                                    del_selected_site_for_brand, del_selected_brand
+                                )
+                            except Exception as e:
+                                st.warning(f"Parquetストアのデータ削除に失敗しました: {e}")
+                            st.rerun()
+                    else:
+                        st.error("指定されたブランドが見つかりませんでした。")
+
 
 
 st.set_page_config(page_title=APP_TITLE, layout="wide")
 st.title(APP_TITLE)
 
+# チャート表示対象: display_name -> target の辞書 (選択順を保持し、追加・削除・所属判定はO(1))
 if "selected_targets_for_chart" not in st.session_state:
-    st.session_state.selected_targets_for_chart = []
+    st.session_state.selected_targets_for_chart = {}
 if "last_active_target_for_update" not in st.session_state:
     st.session_state.last_active_target_for_update = None
 
 with st.sidebar:
     st.header("設定")
-    brands_data_all_sites = load_brands_cached()
+    brands_data_all_sites = load_brands_cached(get_brand_file_mtime_ns())
 
     if not brands_data_all_sites:
         st.error(
             "ブランド情報が読み込めませんでした。brands.jsonが空か、または存在しない可能性があります。"
         )
-        if BRAND_FILE.exists() and BRAND_FILE.read_text() == "":
+        # 中身を読み直さず、1回のstatで「空ファイル」か「ファイルなし」かを判定する
+        brand_file_stat = BRAND_FILE.stat() if BRAND_FILE.exists() else None
+        if brand_file_stat is not None and brand_file_stat.st_size == 0:
             load_brands_cached.clear()
-            brands_data_all_sites = load_brands_cached()
+            brands_data_all_sites = load_brands_cached(get_brand_file_mtime_ns())
             if not brands_data_all_sites:
                 st.stop()
-        elif not BRAND_FILE.exists():
-            brands_data_all_sites = load_brands_cached()
+        elif brand_file_stat is None:
+            brands_data_all_sites = load_brands_cached(get_brand_file_mtime_ns())
             if not brands_data_all_sites:
                 st.stop()
         else:
@@ -271,62 +1009,24 @@ with st.sidebar:
         st.stop()
 
     selected_site_for_display = st.selectbox(
-        "表示/操作するサイトを選択", available_sites, key="sb_site_display_v3"
+        "表示/操作するサイトを選択",
+        available_sites,
+        key="sb_site_display_v3",
+        on_change=on_site_display_change,
     )
 
     st.subheader(f"「{selected_site_for_display}」の表示ブランド選択")
 
-    current_brands_on_site = brands_data_all_sites.get(selected_site_for_display, {})
-    # This list will be rebuilt in each run based on current checkbox states
-    current_run_selected_targets = []
-
-    for category, brands_in_cat in current_brands_on_site.items():
-        with st.expander(f"{category} ({len(brands_in_cat)})", expanded=False):
-            for brand_name_from_json in brands_in_cat:
-                target_obj = {
-                    "site": selected_site_for_display,
-                    "brand_keyword": brand_name_from_json,
-                    "display_name": f"{selected_site_for_display}: {brand_name_from_json}",
-                    "category_for_json": category,
-                }
-                checkbox_key = f"cb_target_{target_obj['display_name'].replace(' ', '_').replace('::','__').replace(':','_')}"
-
-                # Determine the initial value for the checkbox if its state is not yet set.
-                # This should come from the persisted st.session_state.selected_targets_for_chart
-                initial_checked_state = any(
-                    t["display_name"] == target_obj["display_name"]
-                    for t in st.session_state.selected_targets_for_chart
-                )
-
-                # The 'value' param is only used if checkbox_key is not in st.session_state.
-                # Otherwise, st.session_state[checkbox_key] (the widget's own state) is used.
-                is_checked_now = st.checkbox(
-                    f"{brand_name_from_json}",
-                    value=initial_checked_state,  # Used for first render if key not in session_state
-                    key=checkbox_key,
-                )
-                # At this point, st.session_state[checkbox_key] is correctly set by Streamlit.
-
-                if is_checked_now:
-                    current_run_selected_targets.append(target_obj)
-                    st.session_state.last_active_target_for_update = target_obj
-
-    # After iterating through all checkboxes, compare the newly built list
-    # with the persisted list in session_state. If they differ, update and rerun.
-    current_sel_display_names = {
-        t["display_name"] for t in st.session_state.selected_targets_for_chart
-    }
-    new_sel_display_names = {t["display_name"] for t in current_run_selected_targets}
-
-    if current_sel_display_names != new_sel_display_names:
-        st.session_state.selected_targets_for_chart = current_run_selected_targets
-        st.rerun()
+    render_brand_picker(
+        selected_site_for_display,
+        brands_data_all_sites.get(selected_site_for_display, {}),
+    )
 
     if st.session_state.selected_targets_for_chart:
         st.markdown(
             f"**チャート表示対象 ({len(st.session_state.selected_targets_for_chart)}件):**"
         )
-        for t in st.session_state.selected_targets_for_chart[:5]:
+        for t in list(st.session_state.selected_targets_for_chart.values())[:5]:
             st.markdown(f"- `{t['display_name']}`")
         if len(st.session_state.selected_targets_for_chart) > 5:
             st.markdown("  ...")
@@ -336,7 +1036,9 @@ with st.sidebar:
     st.markdown("---")
     if st.session_state.selected_targets_for_chart:
         if st.button("選択した全ブランドのデータを取得・更新", key="btn_bulk_update"):
-            targets_to_scrape = list(st.session_state.selected_targets_for_chart)
+            targets_to_scrape = list(
+                st.session_state.selected_targets_for_chart.values()
+            )
             total_targets = len(targets_to_scrape)
             success_count = 0
             failure_count = 0
@@ -347,19 +1049,17 @@ with st.sidebar:
             with st.spinner(
                 f"選択した {total_targets} 件のブランドデータを一括取得中..."
             ):
-                for i, target in enumerate(targets_to_scrape):
-                    status_text.info(
-                        f"処理中 ({i+1}/{total_targets}): 「{target['display_name']}」..."
-                    )
-                    try:
-                        prices = scrape_prices_for_keyword_and_site(
-                            target["site"],
-                            target["brand_keyword"],
-                            max_items_override=SITE_CONFIGS.get(target["site"], {}).get(
-                                "max_items_to_scrape", 30
-                            ),
+                status_text.info(f"{total_targets} 件をサイトごとに並列で取得しています...")
+                for i, (target, prices, error) in enumerate(
+                    iter_scrape_results(targets_to_scrape)
+                ):
+                    if error is not None:
+                        st.write(
+                            f"❌ 「{target['display_name']}」の処理中にエラー: {error}"
                         )
-                        if prices:
+                        failure_count += 1
+                    elif prices:
+                        try:
                             save_daily_stats_for_site(
                                 target["site"], target["brand_keyword"], prices
                             )
@@ -367,25 +1067,26 @@ with st.sidebar:
                                 f"✅ 「{target['display_name']}」のデータを更新しました。"
                             )
                             success_count += 1
-                        else:
+                        except Exception as e:
                             st.write(
-                                f"⚠️ 「{target['display_name']}」の価格情報が見つかりませんでした。"
+                                f"❌ 「{target['display_name']}」の処理中にエラー: {e}"
                             )
                             failure_count += 1
-                    except Exception as e:
+                    else:
                         st.write(
-                            f"❌ 「{target['display_name']}」の処理中にエラー: {e}"
+                            f"⚠️ 「{target['display_name']}」の価格情報が見つかりませんでした。"
                         )
                         failure_count += 1
+                    status_text.info(
+                        f"完了 ({i+1}/{total_targets}): 「{target['display_name']}」"
+                    )
                     progress_bar.progress((i + 1) / total_targets)
-                    time.sleep(0.1)
 
             status_text.empty()
             progress_bar.empty()
             st.success(
                 f"一括処理完了: {success_count}件成功, {failure_count}件失敗/情報なし。"
             )
-            load_price_data_cached.clear()
             st.rerun()
     else:
         st.info("一括更新を行うには、まず表示ブランドを選択してください。")
@@ -413,8 +1114,6 @@ with st.sidebar:
                     status_placeholder.success("✅ 全ブランドの一括スクレイピングが完了しました！")
                     st.balloons()
                     
-                    # キャッシュをクリアして最新データを反映
-                    load_price_data_cached.clear()
                     time.sleep(2)  # メッセージを表示するための短い待機
                     st.rerun()
                     
@@ -459,7 +1158,6 @@ with st.sidebar:
                         st.success(
                             f"「{active_target_single['display_name']}」のデータを更新しました。"
                         )
-                        load_price_data_cached.clear()
                         st.rerun()
                     else:
                         st.warning(
@@ -486,10 +1184,10 @@ with st.sidebar:
 
     show_range_option_multi_brand_v3 = False
     primary_target_for_band_display_name_v3 = None
-    if st.session_state.last_active_target_for_update and any(
-        t["display_name"]
-        == st.session_state.last_active_target_for_update["display_name"]
-        for t in st.session_state.selected_targets_for_chart
+    if (
+        st.session_state.last_active_target_for_update
+        and st.session_state.last_active_target_for_update["display_name"]
+        in st.session_state.selected_targets_for_chart
     ):
         primary_target_for_band_display_name_v3 = (
             st.session_state.last_active_target_for_update["display_name"]
@@ -501,194 +1199,87 @@ with st.sidebar:
         )
 
     st.markdown("---")
-    with st.expander("ブランド管理 (追加)"):
-        st.subheader("新しいブランドの追加")
-        add_sites_list = list(load_brands_cached().keys())
-        if not add_sites_list:
-            add_sites_list = ["mercari"]
-        add_selected_site_for_new_brand = st.selectbox(
-            "追加先のサイト", add_sites_list, key="add_brand_site_sel_brand"
-        )
-
-        site_categories_for_new_brand = list(
-            load_brands_cached()
-            .get(add_selected_site_for_new_brand, {"未分類": []})
-            .keys()
-        )
-        if not site_categories_for_new_brand:
-            site_categories_for_new_brand = ["未分類"]
-
-        add_selected_category_for_new_brand = st.selectbox(
-            "追加先のカテゴリ (整理用)",
-            site_categories_for_new_brand,
-            key="add_brand_cat_sel_multi_site_brand",
-        )
-        new_brand_name_input_for_add = st.text_input(
-            "追加するブランド名", key="add_brand_name_in_multi_site_brand"
-        )
-
-        if st.button("このブランドを追加", key="add_brand_btn_multi_site_brand"):
-            if (
-                add_selected_site_for_new_brand
-                and add_selected_category_for_new_brand
-                and new_brand_name_input_for_add
-            ):
-                new_brand_name_to_add = new_brand_name_input_for_add.strip()
-                if not new_brand_name_to_add:
-                    st.warning("ブランド名を入力してください。")
-                else:
-                    all_brands_data_for_add = load_brands_cached()
-                    if add_selected_site_for_new_brand not in all_brands_data_for_add:
-                        all_brands_data_for_add[add_selected_site_for_new_brand] = {}
-                    if (
-                        add_selected_category_for_new_brand
-                        not in all_brands_data_for_add[add_selected_site_for_new_brand]
-                    ):
-                        all_brands_data_for_add[add_selected_site_for_new_brand][
-                            add_selected_category_for_new_brand
-                        ] = []
-
-                    if (
-                        new_brand_name_to_add
-                        in all_brands_data_for_add[add_selected_site_for_new_brand][
-                            add_selected_category_for_new_brand
-                        ]
-                    ):
-                        st.warning(
-                            f"ブランド「{new_brand_name_to_add}」はサイト「{add_selected_site_for_new_brand}」のカテゴリ「{add_selected_category_for_new_brand}」に既に存在します。"
-                        )
-                    else:
-                        all_brands_data_for_add[add_selected_site_for_new_brand][
-                            add_selected_category_for_new_brand
-                        ].append(new_brand_name_to_add)
-                        all_brands_data_for_add[add_selected_site_for_new_brand][
-                            add_selected_category_for_new_brand
-                        ].sort()
-                        if save_brands_to_json(all_brands_data_for_add):
-                            st.success(
-                                f"ブランド「{new_brand_name_to_add}」をサイト「{add_selected_site_for_new_brand}」のカテゴリ「{add_selected_category_for_new_brand}」に追加しました。"
-                            )
-                            st.rerun()
-            else:
-                st.warning(
-                    "追加先のサイト、カテゴリ、ブランド名をすべて入力してください。"
-                )
-
-        st.markdown("---")
-        st.subheader("ブランドの削除")
-        del_sites_list = list(load_brands_cached().keys())
-        if not del_sites_list:
-            del_sites_list = ["mercari"]
-        del_selected_site_for_brand = st.selectbox(
-            "削除するブランドのサイト", del_sites_list, key="del_brand_site_sel_brand"
-        )
-
-        del_site_categories = list(
-            load_brands_cached()
-            .get(del_selected_site_for_brand, {"未分類": []})
-            .keys()
-        )
-        if not del_site_categories:
-            del_site_categories = ["未分類"]
-
-        del_selected_category_for_brand = st.selectbox(
-            "削除するブランドのカテゴリ",
-            del_site_categories,
-            key="del_brand_cat_sel_multi_site_brand",
-        )
-
-        brands_in_category = load_brands_cached().get(del_selected_site_for_brand, {}).get(del_selected_category_for_brand, [])
-        if not brands_in_category:
-            st.info(f"「{del_selected_site_for_brand}」の「{del_selected_category_for_brand}」カテゴリにはブランドが登録されていません。")
-        else:
-            del_selected_brand = st.selectbox(
-                "削除するブランド",
-                brands_in_category,
-                key="del_brand_name_sel_multi_site_brand",
-            )
-
-            if st.button("このブランドを削除", key="del_brand_btn_multi_site_brand", type="primary"):
-                if del_selected_brand:
-                    all_brands_data_for_del = load_brands_cached()
-                    if (
-                        del_selected_site_for_brand in all_brands_data_for_del
-                        and del_selected_category_for_brand in all_brands_data_for_del[del_selected_site_for_brand]
-                        and del_selected_brand in all_brands_data_for_del[del_selected_site_for_brand][del_selected_category_for_brand]
-                    ):
-                        all_brands_data_for_del[del_selected_site_for_brand][del_selected_category_for_brand].remove(del_selected_brand)
-                        if save_brands_to_json(all_brands_data_for_del):
-                            st.success(
-                                f"ブランド「{del_selected_brand}」をサイト「{del_selected_site_for_brand}」のカテゴリ「{del_selected_category_for_brand}」から削除しました。"
-                            )
-                            # 関連するCSVファイルも削除
-                            safe_brand_keyword = re.sub(r'[\\/*?:"<>|]', "_", del_selected_brand)
-                            safe_site_name = re.sub(r'[\\/*?:"<>|]', "_", del_selected_site_for_brand)
-                            csv_file = DATA_DIR / f"{safe_site_name}_{safe_brand_keyword}.csv"
-                            if csv_file.exists():
-                                try:
-                                    csv_file.unlink()
-                                    st.info(f"関連するデータファイル（{csv_file.name}）も削除しました。")
-                                except Exception as e:
-                                    st.warning(f"データファイルの削除に失敗しました: {e}")
-                            st.rerun()
-                    else:
-                        st.error("指定されたブランドが見つかりませんでした。")
+    render_brand_management(brands_data_all_sites)
 
 if st.session_state.selected_targets_for_chart:
     dataframes_to_plot_dict_main = {}
     any_data_loaded_for_chart_main = False
-    for target in st.session_state.selected_targets_for_chart:
-        df = load_price_data_cached(target["site"], target["brand_keyword"])
+    # CSVのstatは選択ブランドごとに1回。更新されたブランドだけがキャッシュミスになる
+    csv_signatures = {
+        (target["site"], target["brand_keyword"]): get_price_csv_signature(
+            target["site"], target["brand_keyword"]
+        )
+        for target in st.session_state.selected_targets_for_chart.values()
+    }
+    price_data_by_target = get_price_data_bulk(csv_signatures)
+    for target in st.session_state.selected_targets_for_chart.values():
+        price_key = (target["site"], target["brand_keyword"])
+        df = price_data_by_target[price_key]
         if not df.empty:
             dataframes_to_plot_dict_main[target["display_name"]] = {
                 "df": df,
                 "site": target["site"],
                 "brand_keyword": target["brand_keyword"],
+                "csv_signature": csv_signatures[price_key],
             }
             any_data_loaded_for_chart_main = True
 
             if target["display_name"] == (
                 st.session_state.last_active_target_for_update or {}
             ).get("display_name"):
-                st.subheader(f"📊 「{target['display_name']}」の最新情報")
-                latest_data = df.iloc[-1]
-                delta_text = "N/A"
-                if (
-                    len(df) > 1
-                    and "average_price" in df.iloc[-2].index
-                    and pd.notna(latest_data["average_price"])
-                    and pd.notna(df.iloc[-2]["average_price"])
-                ):
-                    delta_value = (
-                        latest_data["average_price"] - df.iloc[-2]["average_price"]
-                    )
-                    delta_text = f"{delta_value:,.0f} (前日比)"
-                st.metric(
-                    label="最新平均価格",
-                    value=(
-                        f"¥{latest_data['average_price']:,.0f}"
-                        if pd.notna(latest_data["average_price"])
-                        else "N/A"
-                    ),
-                    delta=delta_text,
+                # Seriesを生成せずnumpy配列から直接スカラーを取り出す
+                avg = df["average_price"].to_numpy()
+                latest_avg = avg[-1]
+                prev_avg = avg[-2] if len(avg) > 1 else np.nan
+                delta_html = "N/A"
+                if np.isfinite(latest_avg) and np.isfinite(prev_avg):
+                    delta_value = latest_avg - prev_avg
+                    delta_color = "#09ab3b" if delta_value >= 0 else "#ff2b2b"
+                    delta_html = f"<span style='color:{delta_color}'>{delta_value:+,.0f} (前日比)</span>"
+                latest_value_text = (
+                    f"¥{latest_avg:,.0f}" if np.isfinite(latest_avg) else "N/A"
+                )
+                # 見出しと指標を1つのメッセージにまとめて送る (st.subheader + st.metric の代わり)
+                st.markdown(
+                    f"""<div style='margin:0.5rem 0 1rem'>
+<h3 style='margin-bottom:0.25rem'>📊 「{html.escape(target['display_name'])}」の最新情報</h3>
+<div style='display:flex;gap:2rem;align-items:baseline'>
+<div><div style='font-size:0.875rem;opacity:0.7'>最新平均価格</div>
+<div style='font-size:2.25rem'>{latest_value_text}</div>
+<div style='font-size:0.875rem'>{delta_html}</div></div>
+</div></div>""",
+                    unsafe_allow_html=True,
                 )
 
     if any_data_loaded_for_chart_main:
-        price_chart = create_multi_brand_price_trend_chart(
+        price_chart = build_price_trend_chart_cached(
+            get_chart_targets_key(dataframes_to_plot_dict_main),
             dataframes_to_plot_dict_main,
             ma_short_period,
             ma_long_period,
-            show_price_range_for_primary=show_range_option_multi_brand_v3,
-            primary_target_for_band_display=primary_target_for_band_display_name_v3,
+            show_range_option_multi_brand_v3,
+            primary_target_for_band_display_name_v3,
+        )
+        st.plotly_chart(
+            price_chart,
+            use_container_width=True,
+            theme=None,
+            config=PLOTLY_CHART_CONFIG,
         )
-        st.plotly_chart(price_chart, use_container_width=True)
 
-        with st.expander("選択ブランドの生データ表示 (各最新50件)"):
-            for display_key, data_dict in dataframes_to_plot_dict_main.items():
-                st.markdown(f"**{display_key}**")
-                st.dataframe(
-                    data_dict["df"].sort_values(by="date", ascending=False).head(50)
-                )
+        with st.expander(f"選択ブランドの生データ表示 (各最新{RAW_DATA_ROWS}件)"):
+            # 折りたたまれていても中身は毎回実行されるため、表示を選んだ時だけテーブルを組み立てる
+            if st.checkbox("生データを表示", key="cb_show_raw_data"):
+                for display_key, data_dict in dataframes_to_plot_dict_main.items():
+                    st.markdown(f"**{display_key}**")
+                    st.dataframe(
+                        load_recent_rows_table_cached(
+                            data_dict["site"],
+                            data_dict["brand_keyword"],
+                            data_dict["csv_signature"],
+                        ),
+                        use_container_width=True,
+                    )
     else:
         st.info(
             "選択されたブランドのデータがまだありません。サイドバーでブランドを選択し、必要に応じてデータを取得してください。"
@@ -5,6 +5,10 @@ import time
 import datetime
 import random
 import re
+import functools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from statistics import mean
 
@@ -22,11 +26,38 @@ from selenium.common.exceptions import (
     WebDriverException,
 )
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 
 # === 設定 ===
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 BRAND_FILE = BASE_DIR / "brands.json"
+
+# --- 価格統計のParquetストア (site=/keyword= でHiveパーティション分割) ---
+PRICE_STORE_DIR = DATA_DIR / "prices.parquet"
+PRICE_STORE_SCHEMA = pa.schema(
+    [
+        ("date", pa.timestamp("ms")),
+        ("site", pa.string()),
+        ("keyword", pa.string()),
+        ("count", pa.int32()),
+        ("average_price", pa.float32()),
+        ("min_price", pa.float32()),
+        ("max_price", pa.float32()),
+    ]
+)
+PRICE_STORE_PARTITIONING = ds.partitioning(
+    pa.schema([("site", pa.string()), ("keyword", pa.string())]), flavor="hive"
+)
+# 書き込み (パーティションの削除と再作成) は同じプロセス内のスレッド・セッション間で1つずつ行う
+_PRICE_STORE_WRITE_LOCK = threading.Lock()
+PRICE_STORE_MAX_FRAGMENTS = 32  # 日次の追記ファイルがこれ以上になったらパーティションを1ファイルに書き直す
+CSV_TAIL_READ_BYTES = 1024  # CSVの最終行を探す時に末尾から読み戻す単位
+# 数値列ばかりで繰り返しが多いので、snappyよりよく縮むzstdで保存する
+PRICE_STORE_FILE_OPTIONS = ds.ParquetFileFormat().make_write_options(
+    compression="zstd"
+)
 PAGE_LOAD_TIMEOUT_SECONDS = 75  # Rakuma SNIDEL のタイムアウト対策として全体的に延長
 ELEMENT_WAIT_TIMEOUT_SECONDS = 20  # 要素待機も少し延長
 
@@ -44,6 +75,7 @@ SITE_CONFIGS = {
             'span[class*="price"]',
         ],
         "max_items_to_scrape": 30,
+        "max_workers": 3,  # 一括取得時に同時に動かすWebDriverの上限
         "wait_time_after_load": (2, 4),  # ページロード後の追加待機
         "scroll_count": (2, 3),  # (min_scrolls, max_scrolls)
         "scroll_height": (700, 1100),  # スクロール高さ
@@ -55,6 +87,7 @@ SITE_CONFIGS = {
         "item_container_selectors": [".item-box"],
         "price_inner_selectors": [".price", ".item-price__value"],
         "max_items_to_scrape": 25,
+        "max_workers": 2,  # タイムアウトが出やすいため控えめに
         "wait_time_after_load": (2, 4),
         "scroll_count": (2, 3),
         "scroll_height": (500, 700),
@@ -68,6 +101,41 @@ INTER_SITE_SLEEP_TIME = (8, 15)
 
 DATA_DIR.mkdir(exist_ok=True)
 
+# ChromeDriverのパス (初回の get_chromedriver_path で解決する)
+_CHROMEDRIVER_PATH = None
+_CHROMEDRIVER_PATH_LOCK = threading.Lock()
+
+_SAFE_FILENAME_RE = re.compile(r'[\\/*?:"<>|]')
+# 価格抽出は1回のスクレイピングでアイテム数ぶん呼ばれるので、正規表現は読み込み時に1回だけコンパイルする
+_PRICE_YEN_SYMBOL_RE = re.compile(r"¥\s*([0-9,]+)")
+_PRICE_YEN_WORD_RE = re.compile(r"([0-9,]+)\s*円")
+_PRICE_USD_RE = re.compile(r"US\$\s*([0-9,]+\.?[0-9]*)")
+_NON_DIGIT_RE = re.compile(r"[^0-9]")
+_NON_ALNUM_RE = re.compile(r"[^a-zA-Z0-9]+")
+
+
+@functools.lru_cache(maxsize=4096)
+def safe_file_name(name):
+    # ファイル名に使えない文字を "_" に置き換える (同じ文字列は再計算しない)
+    return _SAFE_FILENAME_RE.sub("_", name)
+
+
+@functools.lru_cache(maxsize=4096)
+def get_price_csv_path(site_name, brand_keyword):
+    # (サイト, ブランド) ごとの価格CSVのパス。ブランド数は brands.json 程度なので全件メモ化する
+    return DATA_DIR / f"{safe_file_name(site_name)}_{safe_file_name(brand_keyword)}.csv"
+
+
+def get_chromedriver_path():
+    # ChromeDriverManager().install() はバージョン確認やダウンロードを伴うので、プロセス内で1回だけ実行する。
+    # 並列ワーカーが同時に呼んでも同じキャッシュディレクトリへ重ねて展開しないようロックで直列化する
+    global _CHROMEDRIVER_PATH
+    if _CHROMEDRIVER_PATH is None:
+        with _CHROMEDRIVER_PATH_LOCK:
+            if _CHROMEDRIVER_PATH is None:
+                _CHROMEDRIVER_PATH = ChromeDriverManager().install()
+    return _CHROMEDRIVER_PATH
+
 
 def setup_driver(site_name=None):
     print(f"{datetime.datetime.now()} WebDriverセットアップ開始... (Site: {site_name})")
@@ -91,7 +159,7 @@ def setup_driver(site_name=None):
             f"{datetime.datetime.now()} ChromeDriverManager().install() を試行します。"
         )
         service = Service(
-            ChromeDriverManager().install()
+            get_chromedriver_path()
         )  # RunnerのChromeバージョンに合わせるため自動検出
         print(f"{datetime.datetime.now()} webdriver.Chrome() を試行します。")
         driver = webdriver.Chrome(service=service, options=options)
@@ -135,6 +203,65 @@ def setup_driver(site_name=None):
         return None
 
 
+def quit_driver(site_name, driver):
+    try:
+        driver.quit()
+        print(f"{datetime.datetime.now()} [{site_name}] WebDriver終了")
+    except Exception as e_quit:
+        print(f"{datetime.datetime.now()} ERROR [{site_name}] WebDriver終了時: {e_quit}")
+
+
+class DriverPool:
+    # 1回の一括取得の間だけ、使い終わったWebDriverをサイトごとに溜めて再利用する
+    # (Chromeの起動は1回数秒かかる)。with を抜けると残っているWebDriverをすべて終了する。
+    # 実行ごとに作るので、別の実行 (別セッション) のWebDriverを終了させることはない
+
+    def __init__(self):
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_queue(self, site_name):
+        with self._lock:
+            return self._queues.setdefault(site_name, queue.Queue())
+
+    def acquire(self, site_name):
+        # 空きのWebDriverがあれば再利用し、なければ新しく起動する。
+        # 同時に使われる数 (= 起動される数) は呼び出し側のワーカー数で決まる
+        try:
+            return self._get_queue(site_name).get_nowait()
+        except queue.Empty:
+            return setup_driver(site_name=site_name)
+
+    def release(self, site_name, driver):
+        # 前の検索のCookieを消してからプールに戻す。消せない (壊れている) ものは終了する
+        try:
+            driver.delete_all_cookies()
+        except Exception as e:
+            print(
+                f"{datetime.datetime.now()} WARN [{site_name}] WebDriverを再利用できないため終了します: {type(e).__name__}"
+            )
+            quit_driver(site_name, driver)
+            return
+        self._get_queue(site_name).put(driver)
+
+    def close(self):
+        with self._lock:
+            queues = list(self._queues.items())
+        for site_name, driver_queue in queues:
+            while True:
+                try:
+                    driver = driver_queue.get_nowait()
+                except queue.Empty:
+                    break
+                quit_driver(site_name, driver)
+
+
 def extract_price_from_text(text_content, site_name="unknown"):
     if not text_content:
         return None
@@ -143,9 +270,9 @@ def extract_price_from_text(text_content, site_name="unknown"):
 
     # 日本円表記の優先順位を上げる
     # 1. "¥1,234" や "¥ 1,234"
-    price_match_yen_symbol_first = re.search(r"¥\s*([0-9,]+)", text_content)
+    price_match_yen_symbol_first = _PRICE_YEN_SYMBOL_RE.search(text_content)
     if price_match_yen_symbol_first:
-        price_digits = re.sub(r"[^0-9]", "", price_match_yen_symbol_first.group(1))
+        price_digits = _NON_DIGIT_RE.sub("", price_match_yen_symbol_first.group(1))
         if price_digits:
             print(
                 f"DEBUG [{site_name}] extract_price (¥記号パターン): '{price_match_yen_symbol_first.group(0)}' -> {price_digits}"
@@ -153,9 +280,9 @@ def extract_price_from_text(text_content, site_name="unknown"):
             return int(price_digits)
 
     # 2. "1,234 円"
-    price_match_yen_word_last = re.search(r"([0-9,]+)\s*円", text_content)
+    price_match_yen_word_last = _PRICE_YEN_WORD_RE.search(text_content)
     if price_match_yen_word_last:
-        price_digits = re.sub(r"[^0-9]", "", price_match_yen_word_last.group(1))
+        price_digits = _NON_DIGIT_RE.sub("", price_match_yen_word_last.group(1))
         if price_digits:
             print(
                 f"DEBUG [{site_name}] extract_price (円表記パターン): '{price_match_yen_word_last.group(0)}' -> {price_digits}"
@@ -163,7 +290,7 @@ def extract_price_from_text(text_content, site_name="unknown"):
             return int(price_digits)
 
     # USドル表記の検出（日本円が取得できなかった場合のフォールバック情報として）
-    price_match_usd = re.search(r"US\$\s*([0-9,]+\.?[0-9]*)", text_content)
+    price_match_usd = _PRICE_USD_RE.search(text_content)
     if price_match_usd:
         price_str_usd = price_match_usd.group(1).replace(",", "")
         # ログには残すが、日本円ではないためスキップ
@@ -177,8 +304,9 @@ def extract_price_from_text(text_content, site_name="unknown"):
 
 
 def scrape_prices_for_keyword_and_site(
-    site_name, keyword_to_search, max_items_override=None
+    site_name, keyword_to_search, max_items_override=None, driver_pool=None
 ):
+    # driver_pool を渡すとWebDriverをそこから借りて返す。渡さなければ起動して最後に終了する
     print(
         f"{datetime.datetime.now()} [{site_name}] スクレイピング開始: {keyword_to_search}"
     )
@@ -198,7 +326,11 @@ def scrape_prices_for_keyword_and_site(
         "page_load_timeout", PAGE_LOAD_TIMEOUT_SECONDS
     )
 
-    driver = setup_driver(site_name=site_name)
+    driver = (
+        driver_pool.acquire(site_name)
+        if driver_pool is not None
+        else setup_driver(site_name=site_name)
+    )
     if not driver:
         print(
             f"{datetime.datetime.now()} [{site_name}] WebDriver起動失敗 '{keyword_to_search}' スキップ。"
@@ -206,6 +338,7 @@ def scrape_prices_for_keyword_and_site(
         return []
 
     prices = []
+    driver_reusable = True
     try:
         url = config["url_template"].format(keyword=keyword_to_search)
         print(
@@ -232,7 +365,7 @@ def scrape_prices_for_keyword_and_site(
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 debug_file_base = (
                     DATA_DIR
-                    / f"debug_{site_name}_{re.sub(r'[^a-zA-Z0-9]+', '_', keyword_to_search)}_{timestamp}"
+                    / f"debug_{site_name}_{_NON_ALNUM_RE.sub('_', keyword_to_search)}_{timestamp}"
                 )
                 source_path = debug_file_base.with_suffix(".html")
                 screenshot_path = debug_file_base.with_suffix(".png")
@@ -369,7 +502,6 @@ def scrape_prices_for_keyword_and_site(
 
                         if items_collected_count >= max_items_to_collect:
                             break
-                        time.sleep(random.uniform(0.02, 0.08))
 
                     if items_collected_count >= max_items_to_collect:
                         break
@@ -405,28 +537,27 @@ def scrape_prices_for_keyword_and_site(
             )
 
     except TimeoutException as e_page_load:
+        # 読み込み途中のタブが残るので再利用しない
+        driver_reusable = False
         print(
             f"{datetime.datetime.now()} ERROR [{site_name}] ページ読込タイムアウト({current_page_load_timeout}秒): {keyword_to_search} - {getattr(e_page_load, 'msg', str(e_page_load))}"
         )
     except WebDriverException as e_wd_main:
+        driver_reusable = False
         print(
             f"{datetime.datetime.now()} ERROR [{site_name}] WebDriver操作中: {keyword_to_search} - {type(e_wd_main).__name__}: {getattr(e_wd_main, 'msg', str(e_wd_main))}"
         )
     except Exception as e_main:
+        driver_reusable = False
         print(
             f"{datetime.datetime.now()} ERROR [{site_name}] スクレイピング全体で予期せぬエラー: {keyword_to_search} - {type(e_main).__name__}: {e_main}"
         )
     finally:
-        if driver:
-            try:
-                driver.quit()
-                print(
-                    f"{datetime.datetime.now()} [{site_name}] WebDriver終了: {keyword_to_search}"
-                )
-            except Exception as e_quit:
-                print(
-                    f"{datetime.datetime.now()} ERROR [{site_name}] WebDriver終了時: {e_quit}"
-                )
+        # 正常に終わったWebDriverは次のキーワードで使い回す
+        if driver_pool is not None and driver_reusable:
+            driver_pool.release(site_name, driver)
+        else:
+            quit_driver(site_name, driver)
 
     print(
         f"{datetime.datetime.now()} [{site_name}] キーワード '{keyword_to_search}' で {len(prices)} 件の価格を取得完了。"
@@ -438,6 +569,77 @@ def scrape_prices_for_keyword_and_site(
 # ... (前のCanvasのコードの残りの部分をここにコピーしてください) ...
 
 
+def read_csv_header_and_last_line(file_path):
+    # 先頭行と、末尾から少しずつ読み戻した最後の行だけを返す (ファイル全体は読まない)
+    with open(file_path, "rb") as f:
+        header_line = f.readline()
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b""
+        while pos > 0 and b"\n" not in tail.rstrip(b"\r\n"):
+            step = min(CSV_TAIL_READ_BYTES, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+    last_line = tail.rstrip(b"\r\n").rsplit(b"\n", 1)[-1]
+    return (
+        header_line.decode("utf-8").rstrip("\r\n"),
+        last_line.decode("utf-8").rstrip("\r"),
+        tail.endswith(b"\n"),
+    )
+
+
+def append_daily_stats_row(site_name, brand_keyword, file_path, new_data_row):
+    # 本日分の行がまだなく末尾に足しても日付昇順が保てる場合だけ、CSVとParquetストアに1行ずつ追記する。
+    # 追記できない (本日分の上書き・列構成が違う・ストアが古い/ファイルが多すぎる等) 場合は
+    # False を返し、pandasでの全体書き直し (CSVとパーティションの作り直し) に回す
+    fieldnames = list(new_data_row.keys())
+    try:
+        if not file_path.exists() or file_path.stat().st_size == 0:
+            with open(file_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+                writer.writeheader()
+                writer.writerow(new_data_row)
+            save_price_partition(site_name, brand_keyword, pd.DataFrame([new_data_row]))
+            return True
+
+        header_line, last_line, ends_with_newline = read_csv_header_and_last_line(
+            file_path
+        )
+        if next(csv.reader([header_line])) != fieldnames or last_line == header_line:
+            return False
+        last_date = next(csv.reader([last_line]), [""])[0]
+        # 日付はISO形式 (YYYY-MM-DD) なので文字列比較で前後が判定できる
+        if not last_date or last_date >= new_data_row["date"]:
+            return False
+
+        # CSVに追記する前に、パーティションが今のCSVと揃っているかを確認する
+        partition_paths = get_price_partition_paths(site_name, brand_keyword)
+        if (
+            not partition_paths
+            or len(partition_paths) >= PRICE_STORE_MAX_FRAGMENTS
+            or max(path.stat().st_mtime_ns for path in partition_paths)
+            < file_path.stat().st_mtime_ns
+        ):
+            return False
+
+        with open(file_path, "a", encoding="utf-8", newline="") as f:
+            if not ends_with_newline:
+                f.write("\n")
+            csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n").writerow(
+                new_data_row
+            )
+    except Exception as e:
+        print(
+            f"{datetime.datetime.now()} WARN: {file_path} への追記失敗: {e}。全体を書き直します。"
+        )
+        return False
+
+    # CSVより後に書くので、成功すればパーティションはそのまま新しいものとして読まれる
+    append_price_partition_row(site_name, brand_keyword, new_data_row)
+    return True
+
+
 def save_daily_stats_for_site(site_name, brand_keyword, prices):
     if not prices:
         print(
@@ -446,10 +648,8 @@ def save_daily_stats_for_site(site_name, brand_keyword, prices):
         return
 
     today_str = datetime.date.today().isoformat()
-    safe_brand_keyword = re.sub(r'[\\/*?:"<>|]', "_", brand_keyword)
-    safe_site_name = re.sub(r'[\\/*?:"<>|]', "_", site_name)
-    file_name = f"{safe_site_name}_{safe_brand_keyword}.csv"
-    file_path = DATA_DIR / file_name
+    file_path = get_price_csv_path(site_name, brand_keyword)
+    file_name = file_path.name
 
     count = len(prices)
     average_price = mean(prices) if prices else 0
@@ -461,11 +661,17 @@ def save_daily_stats_for_site(site_name, brand_keyword, prices):
         "site": site_name,
         "keyword": brand_keyword,
         "count": count,
-        "average_price": round(average_price, 2),
+        "average_price": round(float(average_price), 2),
         "min_price": min_price,
         "max_price": max_price,
     }
 
+    if append_daily_stats_row(site_name, brand_keyword, file_path, new_data_row):
+        print(
+            f"{datetime.datetime.now()} INFO [{site_name}] '{brand_keyword}' 新規価格統計保存: {file_name}"
+        )
+        return
+
     df_existing = pd.DataFrame(columns=list(new_data_row.keys()))
     try:
         if file_path.exists() and os.path.getsize(file_path) > 0:
@@ -532,13 +738,116 @@ def save_daily_stats_for_site(site_name, brand_keyword, prices):
             df_existing = df_existing.drop_duplicates(
                 subset=["site", "keyword", "date"], keep="first"
             )
-            df_existing = df_existing.sort_values(by="date", ascending=True)
+            # 読み込み側は日付昇順を前提にソートを省くので、ここで必ず昇順にしておく
+            df_existing = df_existing.sort_values(
+                by="date", ascending=True, kind="mergesort"
+            )
 
         df_existing.to_csv(file_path, index=False, encoding="utf-8")
     except Exception as e:
         print(
             f"{datetime.datetime.now()} ERROR データ保存中 ({file_path}): {type(e).__name__} - {e}"
         )
+        return
+
+    save_price_partition(site_name, brand_keyword, df_existing)
+
+
+def open_price_store():
+    if not PRICE_STORE_DIR.exists():
+        return None
+    # スキーマを固定し、書き換え中のファイルからの推論に頼らない
+    return ds.dataset(
+        PRICE_STORE_DIR,
+        schema=PRICE_STORE_SCHEMA,
+        format="parquet",
+        partitioning=PRICE_STORE_PARTITIONING,
+    )
+
+
+def price_partition_filter(site_name, brand_keyword):
+    return (ds.field("site") == site_name) & (ds.field("keyword") == brand_keyword)
+
+
+def delete_price_partition(site_name, brand_keyword):
+    with _PRICE_STORE_WRITE_LOCK:
+        dataset = open_price_store()
+        if dataset is None:
+            return
+        for fragment in dataset.get_fragments(
+            filter=price_partition_filter(site_name, brand_keyword)
+        ):
+            fragment_path = Path(fragment.path)
+            fragment_path.unlink(missing_ok=True)
+            if not any(fragment_path.parent.iterdir()):
+                fragment_path.parent.rmdir()
+
+
+def get_price_partition_paths(site_name, brand_keyword):
+    dataset = open_price_store()
+    if dataset is None:
+        return []
+    return [
+        Path(fragment.path)
+        for fragment in dataset.get_fragments(
+            filter=price_partition_filter(site_name, brand_keyword)
+        )
+    ]
+
+
+def to_price_store_table(site_name, brand_keyword, df):
+    df_store = df[PRICE_STORE_SCHEMA.names].copy()
+    df_store["site"] = site_name
+    df_store["keyword"] = brand_keyword
+    df_store["date"] = pd.to_datetime(df_store["date"]).astype("datetime64[ms]")
+    df_store = df_store.sort_values(by="date", kind="mergesort")
+    return pa.Table.from_pandas(
+        df_store, schema=PRICE_STORE_SCHEMA, preserve_index=False, safe=False
+    )
+
+
+def append_price_partition_row(site_name, brand_keyword, new_data_row):
+    # 1日分の行を日付入りの別ファイルとしてパーティションに足す (既存ファイルは書き直さない)。
+    # ファイル名の順が日付順になるので、読み込み側は従来どおり日付昇順で受け取れる
+    try:
+        table = to_price_store_table(
+            site_name, brand_keyword, pd.DataFrame([new_data_row])
+        )
+        with _PRICE_STORE_WRITE_LOCK:
+            ds.write_dataset(
+                table,
+                PRICE_STORE_DIR,
+                format="parquet",
+                partitioning=PRICE_STORE_PARTITIONING,
+                existing_data_behavior="overwrite_or_ignore",
+                basename_template=f"part-{new_data_row['date']}-{{i}}.parquet",
+                file_options=PRICE_STORE_FILE_OPTIONS,
+            )
+    except Exception as e:
+        print(
+            f"{datetime.datetime.now()} ERROR [{site_name}] Parquetストア追記中 ({brand_keyword}): {type(e).__name__} - {e}"
+        )
+
+
+def save_price_partition(site_name, brand_keyword, df):
+    # (site, keyword) のパーティションを日付昇順で丸ごと書き直す (追記したファイルもまとめて1つにする)
+    # 読み込み側はソートや日付変換をせずにそのまま使える
+    try:
+        table = to_price_store_table(site_name, brand_keyword, df)
+        with _PRICE_STORE_WRITE_LOCK:
+            ds.write_dataset(
+                table,
+                PRICE_STORE_DIR,
+                format="parquet",
+                partitioning=PRICE_STORE_PARTITIONING,
+                existing_data_behavior="delete_matching",
+                basename_template="part-{i}.parquet",
+                file_options=PRICE_STORE_FILE_OPTIONS,
+            )
+    except Exception as e:
+        print(
+            f"{datetime.datetime.now()} ERROR [{site_name}] Parquetストア保存中 ({brand_keyword}): {type(e).__name__} - {e}"
+        )
 
 
 def load_brands_from_json():
@@ -555,6 +864,43 @@ def load_brands_from_json():
         return {}
 
 
+def scrape_and_save_brand(
+    site_name, brand_keyword, progress_label, sleep_after, driver_pool=None
+):
+    brand_loop_start_time = datetime.datetime.now()
+    print(
+        f"{brand_loop_start_time}     - ブランド ({progress_label}): {brand_keyword} ({site_name})"
+    )
+    try:
+        prices = scrape_prices_for_keyword_and_site(
+            site_name, brand_keyword, driver_pool=driver_pool
+        )
+
+        if prices:
+            save_daily_stats_for_site(site_name, brand_keyword, prices)
+        else:
+            print(
+                f"{datetime.datetime.now()} INFO [{site_name}] ブランド '{brand_keyword}' の有効な価格情報が見つからなかったため、CSVファイルは更新/作成されません。"
+            )
+    except Exception as e:
+        print(
+            f"{datetime.datetime.now()} ERROR [{site_name}] ブランド '{brand_keyword}' 処理中: {type(e).__name__} - {e}"
+        )
+
+    brand_loop_end_time = datetime.datetime.now()
+    print(
+        f"{brand_loop_end_time}     - ブランド '{brand_keyword}' 処理完了。所要時間: {brand_loop_end_time - brand_loop_start_time}"
+    )
+
+    # 同じワーカーが次のブランドに進む前に間隔を空ける
+    if sleep_after:
+        sleep_duration = random.uniform(*INTER_BRAND_SLEEP_TIME)
+        print(
+            f"{datetime.datetime.now()}     - 次のブランドまで {sleep_duration:.1f} 秒待機..."
+        )
+        time.sleep(sleep_duration)
+
+
 def main_scrape_all():
     overall_start_time = datetime.datetime.now()
     print(f"{overall_start_time} 一括スクレイピング処理を開始します...")
@@ -581,40 +927,30 @@ def main_scrape_all():
             )
             continue
 
+        brand_keywords = []
         for category_name, brands_in_category in site_brands_data.items():
             print(
-                f"{datetime.datetime.now()}   -- カテゴリ処理中: {category_name} ({len(brands_in_category)}ブランド) --"
+                f"{datetime.datetime.now()}   -- カテゴリ: {category_name} ({len(brands_in_category)}ブランド) --"
             )
-            for brand_idx_in_cat, brand_keyword in enumerate(brands_in_category):
-                brand_loop_start_time = datetime.datetime.now()
-                print(
-                    f"{brand_loop_start_time}     - ブランド ({brand_idx_in_cat+1}/{len(brands_in_category)}): {brand_keyword} ({site_name})"
+            brand_keywords.extend(brands_in_category)
+
+        # サイトの上限数までのワーカーでブランドを並列に取得する。
+        # WebDriverはこのサイトの処理の間だけプールで使い回すので、起動はワーカー数ぶんだけで済む
+        # (ワーカーの終了を待ってからプールを閉じる)
+        max_workers = SITE_CONFIGS[site_name].get("max_workers", 1)
+        with DriverPool() as driver_pool, ThreadPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            for brand_idx, brand_keyword in enumerate(brand_keywords):
+                executor.submit(
+                    scrape_and_save_brand,
+                    site_name,
+                    brand_keyword,
+                    f"{brand_idx+1}/{len(brand_keywords)}",
+                    brand_idx < len(brand_keywords) - max_workers,
+                    driver_pool=driver_pool,
                 )
 
-                prices = scrape_prices_for_keyword_and_site(site_name, brand_keyword)
-
-                if prices:
-                    save_daily_stats_for_site(site_name, brand_keyword, prices)
-                else:
-                    print(
-                        f"{datetime.datetime.now()} INFO [{site_name}] ブランド '{brand_keyword}' の有効な価格情報が見つからなかったため、CSVファイルは更新/作成されません。"
-                    )
-
-                brand_loop_end_time = datetime.datetime.now()
-                print(
-                    f"{brand_loop_end_time}     - ブランド '{brand_keyword}' 処理完了。所要時間: {brand_loop_end_time - brand_loop_start_time}"
-                )
-
-                if brand_idx_in_cat < len(brands_in_category) - 1:
-                    sleep_duration = random.uniform(*INTER_BRAND_SLEEP_TIME)
-                    print(
-                        f"{datetime.datetime.now()}     - 次のブランドまで {sleep_duration:.1f} 秒待機..."
-                    )
-                    time.sleep(sleep_duration)
-            print(
-                f"{datetime.datetime.now()}   -- カテゴリ '{category_name}' 処理完了 --"
-            )
-
         site_process_end_time = datetime.datetime.now()
         print(
             f"{site_process_end_time} --- サイト '{site_name}' 処理完了。所要時間: {site_process_end_time - site_process_start_time} ---"